@@ -2,6 +2,9 @@
 from pprint import pprint
 
 import pysicktim.pysicktim.pysicktim as pysicktim
+from pysicktim.pysicktim.timing import ClockSync
+from pysicktim.pysicktim.deskew import deskew, ConstantVelocity
+from pysicktim.pysicktim.codec import ScanEncoder, ScanDecoder
 from easydict import EasyDict as edict
 import logging
 
@@ -38,6 +41,27 @@ print("Device state: " + lidar.devicestate())
 scan = lidar.scan()
 pprint(scan)
 
+# Device clock counters can be mapped to host time (time.monotonic()) with a ClockSync estimator.
+# Feed it every scan, the drift between the clocks is estimated over a sliding window.
+sync = ClockSync()
+sync.update_from_scan(scan)
+beam_times = sync.beam_times(scan)  # numpy array with a host timestamp per distance
+
+# Compensate the motion of the sensor during the sweep. Use a PoseBuffer for timestamped odometry,
+# or ConstantVelocity(vx, vy, omega) with the beam times relative to the start of the scan.
+points = deskew(scan, ConstantVelocity(2.0, 0.0, 0.1))  # (n, 2) array in meters
+
+# Scans can be compressed for recording or relaying. Encoder and decoder are stateful,
+# use one of each per stream. Backends: "none", "zlib", "bz2", "lzma"
+encoder = ScanEncoder(backend="zlib")
+frame = encoder.encode(scan)
+scan = ScanDecoder().decode(frame)
+
+# Only one client can poll the device at a time. A Relay (see pysicktim.relay) holds the device
+# connection and fans the scans out to many RelayClient objects, which mirror open(), scan() and close():
+#   Relay(lidar, address=("127.0.0.1", 2112)).serve_forever()     # in the relay process
+#   client = RelayClient(("127.0.0.1", 2112)); client.open(); client.scan()
+
 # Close lidar after operations are finished
 lidar.close()
 
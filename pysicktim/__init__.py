@@ -1 +1,8 @@
-from pysicktim.pysicktim import *
+from .pysicktim import *
+from .timing import ClockSync, beam_offsets, meas_freq_hz
+from .deskew import deskew, points, angles, PoseBuffer, ConstantVelocity
+from .codec import ScanEncoder, ScanDecoder, CodecError, write_frame, read_frame, iter_frames
+from .relay import Relay, RelayClient
+from .poller import ScanPoller
+from .emulator import Emulator, telegram, synthetic_scans
+from .health import health, invalid_ratio, status_names
@@ -0,0 +1,320 @@
+### Command line tool for field diagnostics
+#
+#   pysicktim record   OUTPUT            record scans of a device to a file
+#   pysicktim replay   INPUT             serve a recording on a local emulated device
+#   pysicktim bench    [INPUT]           benchmark parsing and codec throughput
+#   pysicktim stats    SENSOR [SENSOR]   print live frame rate, latency, dropped frames and health
+#   pysicktim relay                      republish one device to many local clients
+import argparse
+import sys
+import threading
+import time
+import logging
+
+import numpy as np
+
+from .pysicktim import LiDAR, LidarException, LidarNotFound, parse_scan
+from .timing import ClockSync
+from .codec import BACKENDS, ScanEncoder, ScanDecoder, write_frame, iter_frames
+from .emulator import Emulator, telegram, synthetic_scans
+from .poller import ScanPoller
+from .relay import Relay
+from .health import health, status_names
+
+log = logging.getLogger(__name__)
+
+ERROR_BACKOFF = 0.1     # seconds to wait before polling again after the device answered with an error
+
+
+def _sensor(s):
+    """
+    Parses a sensor address of the form ip[:port].
+    """
+    ip, _, port = s.partition(":")
+    return ip, int(port) if port else 2111
+
+
+def _load(path):
+    with open(path, "rb") as f:
+        return list(iter_frames(f))
+
+
+################################################################
+#   record
+
+def _poll(poller, sensor):
+    """
+    Returns the next new scan, device errors and telegrams that can not be parsed are logged and skipped.
+    Connection errors are raised.
+    """
+    while True:
+        try:
+            return poller.poll()
+        except LidarException as e:
+            log.warning(f"{sensor}: scan failed: {e}")
+            time.sleep(ERROR_BACKOFF)
+        except (ValueError, IndexError, AssertionError) as e:
+            log.warning(f"{sensor}: skipping scan that can not be parsed: {e!r}")
+
+
+def record(args):
+    ip, port = _sensor(args.sensor)
+    encoder = ScanEncoder(backend=args.backend, keyframe_interval=args.keyframe_interval)
+
+    frames = 0
+    size = 0
+    error = None
+    lidar = None
+    start = time.monotonic()
+    try:
+        lidar = LiDAR(tcp_ip=ip, tcp_port=port, socket_timeout=args.timeout)
+        lidar.open()
+        poller = ScanPoller(lidar)
+        with open(args.output, "wb") as f:
+            while (args.count is None or frames < args.count) and \
+                    (args.duration is None or time.monotonic() - start < args.duration):
+                frame = encoder.encode(_poll(poller, args.sensor))
+                write_frame(f, frame)
+                frames += 1
+                size += len(frame) + 4
+    except KeyboardInterrupt:
+        pass
+    except (OSError, RuntimeError, LidarNotFound) as e:
+        # device disconnected, timed out or the replay ended
+        error = e
+    finally:
+        if lidar is not None:
+            lidar.close()
+
+    elapsed = time.monotonic() - start
+    print(f"Recorded {frames} frames in {elapsed:.1f} s to {args.output} ({size / 1024:.1f} KiB)")
+    if error is not None:
+        print(f"Recording stopped: {error}", file=sys.stderr)
+        return 1
+
+
+################################################################
+#   replay
+
+def replay(args):
+    emulator = Emulator(_load(args.input), address=(args.host, args.port), speed=args.speed, loop=args.loop)
+    emulator.open()
+    print(f"Replaying {len(emulator.frames)} frames at {args.speed}x on {emulator.address[0]}:{emulator.address[1]}")
+    try:
+        emulator.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"Served {emulator.served} scans")
+
+
+################################################################
+#   bench
+
+def _rate(label, count, elapsed, extra=""):
+    print(f"{label:<8} {count / elapsed:10.1f} frames/s {elapsed / count * 1e3:8.3f} ms/frame {extra}")
+
+
+def bench(args):
+    if args.input:
+        decoder = ScanDecoder()
+        telegrams = [telegram(decoder.decode(frame)) for frame in _load(args.input)]
+    else:
+        telegrams = [telegram(synthetic_scans()[0])]
+    telegrams = (telegrams * (args.frames // len(telegrams) + 1))[:args.frames]
+
+    start = time.perf_counter()
+    scans = [parse_scan(t) for t in telegrams]
+    _rate("parse", len(scans), time.perf_counter() - start)
+
+    raw = sum(len(t) + 2 for t in telegrams)
+    backends = [args.backend] if args.backend else list(BACKENDS)
+    for backend in backends:
+        encoder = ScanEncoder(backend=backend)
+        start = time.perf_counter()
+        frames = [encoder.encode(scan) for scan in scans]
+        encode_time = time.perf_counter() - start
+
+        decoder = ScanDecoder()
+        start = time.perf_counter()
+        for frame in frames:
+            decoder.decode(frame)
+        decode_time = time.perf_counter() - start
+
+        ratio = raw / sum(len(frame) + 4 for frame in frames)
+        _rate("encode", len(frames), encode_time, f"{backend} ratio {ratio:.1f}x")
+        _rate("decode", len(frames), decode_time, backend)
+
+
+################################################################
+#   stats
+
+class SensorStats:
+    """
+    Polls one sensor and accumulates frame rate, round trip time, latency jitter and dropped frames.
+    """
+
+    def __init__(self, sensor, timeout):
+        self.sensor = sensor
+        self.timeout = timeout
+        self.lidar = None
+        self.sync = ClockSync()
+        self.lock = threading.Lock()
+        self.error = None
+        self.total = 0
+        self.dropped_total = 0
+        self.duplicates_total = 0
+        self._last_cnt = None
+        self._clear()
+
+    def _clear(self):
+        self.frames = 0
+        self.dropped = 0
+        self.duplicates = 0
+        self.rtt = []
+        self.jitter = []
+        self.invalid = []
+        self.status = set()
+
+    def run(self):
+        try:
+            ip, port = _sensor(self.sensor)
+            # connects and reads the device info, so unreachable sensors only fail their own thread
+            self.lidar = LiDAR(tcp_ip=ip, tcp_port=port, socket_timeout=self.timeout)
+            self.lidar.open()
+            poller = ScanPoller(self.lidar)
+            while True:
+                scan = _poll(poller, self.sensor)
+                self.sync.update_from_scan(scan)
+                with self.lock:
+                    self.frames += 1
+                    self.total += 1
+                    # polls that returned the latest scan again, paced to about one per scan
+                    self.duplicates += poller.duplicates - self.duplicates_total
+                    self.duplicates_total = poller.duplicates
+                    self.rtt.append(poller.rtt)
+                    # reception delay above the fastest observed transfer
+                    self.jitter.append(scan.host_time - self.sync.to_host(scan.trans_time))
+                    if self._last_cnt is not None:
+                        gap = (scan.scan_cnt - self._last_cnt - 1) % 0x10000   # UINT16 counter
+                        self.dropped += gap
+                        self.dropped_total += gap
+                    self._last_cnt = scan.scan_cnt
+                    h = health(scan)
+                    self.status.update(status_names(h))
+                    if h.invalid_ratio is not None:
+                        self.invalid.append(h.invalid_ratio)
+        except Exception as e:
+            self.error = e
+        finally:
+            if self.lidar is not None:
+                self.lidar.close()
+
+    def report(self, interval):
+        with self.lock:
+            if self.error is not None:
+                line = f"{self.sensor:<22} ERROR {self.error}"
+            elif self.frames == 0:
+                line = f"{self.sensor:<22} no frames"
+            else:
+                rtt = np.array(self.rtt) * 1e3
+                jitter = np.array(self.jitter) * 1e3
+                line = (f"{self.sensor:<22} {self.frames / interval:6.1f} fps"
+                        f"  rtt {rtt.mean():6.1f}/{rtt.max():6.1f} ms"
+                        f"  jitter {jitter.mean():5.1f}/{jitter.max():5.1f} ms"
+                        f"  dropped {self.dropped} ({self.dropped_total} total)"
+                        f"  duplicates {self.duplicates} ({self.duplicates_total} total)"
+                        f"  drift {self.sync.drift_ppm:+.0f} ppm"
+                        f"  invalid {format(np.mean(self.invalid), '4.0%') if self.invalid else ' n/a'}"
+                        f"  status {','.join(sorted(self.status)) or 'ok'}")
+            self._clear()
+        return line
+
+
+def stats(args):
+    sensors = [SensorStats(s, args.timeout) for s in args.sensors]
+    for s in sensors:
+        threading.Thread(target=s.run, name=f"stats-{s.sensor}", daemon=True).start()
+
+    try:
+        while any(s.error is None for s in sensors):
+            time.sleep(args.interval)
+            for s in sensors:
+                print(s.report(args.interval))
+            if len(sensors) > 1:
+                print()
+    except KeyboardInterrupt:
+        pass
+
+
+################################################################
+#   relay
+
+def relay(args):
+    ip, port = _sensor(args.sensor)
+    address = args.unix if args.unix else (args.host, args.port)
+    lidar = LiDAR(tcp_ip=ip, tcp_port=port, socket_timeout=args.timeout)
+    r = Relay(lidar, address=address, backend=args.backend, queue_size=args.queue_size)
+    if not r.serve_forever():
+        print(f"Lost the connection to {args.sensor}, relayed {r.frames} frames", file=sys.stderr)
+        return 1
+    print(f"Relayed {r.frames} frames")
+
+
+################################################################
+
+def parser():
+    p = argparse.ArgumentParser(prog="pysicktim", description="Tools for SICK TiM5xx LiDAR sensors")
+    p.add_argument("-v", "--verbose", action="store_true", help="debug logging")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    s = sub.add_parser("record", help="record scans of a device to a file")
+    s.add_argument("output", help="recording file")
+    s.add_argument("-s", "--sensor", default="169.254.219.5", help="ip[:port] of the device")
+    s.add_argument("-n", "--count", type=int, help="amount of scans to record")
+    s.add_argument("-d", "--duration", type=float, help="seconds to record")
+    s.add_argument("-b", "--backend", default="zlib", choices=list(BACKENDS))
+    s.add_argument("--keyframe-interval", type=int, default=50)
+    s.add_argument("--timeout", type=float, default=5.0, help="socket timeout in seconds")
+    s.set_defaults(func=record)
+
+    s = sub.add_parser("replay", help="serve a recording on a local emulated device")
+    s.add_argument("input", help="recording file")
+    s.add_argument("--host", default="127.0.0.1")
+    s.add_argument("-p", "--port", type=int, default=2111)
+    s.add_argument("-x", "--speed", type=float, default=1.0, help="replay speed factor")
+    s.add_argument("-l", "--loop", action="store_true", help="restart the recording at its end")
+    s.set_defaults(func=replay)
+
+    s = sub.add_parser("bench", help="benchmark parsing and codec throughput")
+    s.add_argument("input", nargs="?", help="recording file, a synthetic scan is used otherwise")
+    s.add_argument("-n", "--frames", type=int, default=1000)
+    s.add_argument("-b", "--backend", choices=list(BACKENDS), help="only benchmark this backend")
+    s.set_defaults(func=bench)
+
+    s = sub.add_parser("stats", help="print live frame rate, latency, dropped frames and health")
+    s.add_argument("sensors", nargs="+", help="ip[:port] of the devices")
+    s.add_argument("-i", "--interval", type=float, default=1.0, help="report interval in seconds")
+    s.add_argument("--timeout", type=float, default=5.0, help="socket timeout in seconds")
+    s.set_defaults(func=stats)
+
+    s = sub.add_parser("relay", help="republish one device to many local clients")
+    s.add_argument("-s", "--sensor", default="169.254.219.5", help="ip[:port] of the device")
+    s.add_argument("--host", default="127.0.0.1")
+    s.add_argument("-p", "--port", type=int, default=2112)
+    s.add_argument("-u", "--unix", help="listen on this Unix socket path instead of TCP")
+    s.add_argument("-b", "--backend", default="none", choices=list(BACKENDS))
+    s.add_argument("-q", "--queue-size", type=int, default=8, help="frames buffered per subscriber")
+    s.add_argument("--timeout", type=float, default=5.0, help="socket timeout in seconds")
+    s.set_defaults(func=relay)
+
+    return p
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,432 @@
+### Compression codec for decoded scans
+#
+#   Every frame is encoded independently of the transport. The distance and RSSI channels are
+#   delta encoded, either between adjacent beams (keyframes) or against the previous frame,
+#   whichever packs smaller. The residuals are zigzag/varint packed and the frame is compressed
+#   with one of the stdlib backends.
+#
+#   Frame layout:
+#       1 byte flags | compressed body
+#   Body layout:
+#       host_time (float64) | header varints | scale factors (2x float32) | labels | channels
+import struct
+import zlib
+import bz2
+import lzma
+import logging
+
+import numpy as np
+from easydict import EasyDict as edict
+
+log = logging.getLogger(__name__)
+
+
+BACKENDS = {
+    "none": (0, lambda b: b, lambda b: b),
+    "zlib": (1, lambda b: zlib.compress(b, 6), zlib.decompress),
+    "bz2": (2, bz2.compress, bz2.decompress),
+    "lzma": (3, lzma.compress, lzma.decompress),
+}
+_BACKEND_IDS = {v[0]: k for k, v in BACKENDS.items()}
+
+FLAG_KEYFRAME = 0x80
+FLAG_BACKEND = 0x03
+
+MODE_SPATIAL = 0    # delta between adjacent beams
+MODE_TEMPORAL = 1   # delta against the same beam of the previous frame
+
+# Integer fields of scan() stored in the frame header, None is stored as -1
+HEADER_FIELDS = (
+    "telegram_len", "version", "device_num", "serial_num", "device_stat", "telegram_cnt", "scan_cnt",
+    "uptime", "trans_time", "input_stat", "output_stat", "layer_ang", "enc_amount", "num_16bit_chan",
+    "dist_start", "dist_start_ang", "dist_angle_res",
+    "rssi_start", "rssi_scale_fact", "rssi_scale_fact_offset", "rssi_start_ang", "rssi_angle_res",
+)
+
+
+class CodecError(Exception):
+    pass
+
+
+################################################################
+#   Zigzag / varint packing
+
+def zigzag(a):
+    a = np.asarray(a, dtype=np.int64)
+    return ((a << 1) ^ (a >> 63)).astype(np.uint64)
+
+
+def unzigzag(a):
+    a = np.asarray(a, dtype=np.uint64)
+    return ((a >> np.uint64(1)).astype(np.int64)) ^ -((a & np.uint64(1)).astype(np.int64))
+
+
+def _varint_sizes(u):
+    sizes = np.ones(u.shape, dtype=np.int64)
+    if u.size == 0:
+        return sizes
+    top = u.max()
+    for k in range(1, 10):
+        threshold = np.uint64(1) << np.uint64(7 * k)
+        if top < threshold:
+            break
+        sizes += u >= threshold
+    return sizes
+
+
+def varint_pack(u):
+    """
+    Packs unsigned integers as LEB128 varints. Vectorized.
+    :param u: array of unsigned integers
+    :return: bytes
+    """
+    u = np.asarray(u, dtype=np.uint64)
+    if u.size == 0:
+        return b""
+    sizes = _varint_sizes(u)
+    width = int(sizes.max())
+
+    shifts = np.arange(width, dtype=np.uint64) * np.uint64(7)
+    groups = (u[:, None] >> shifts) & np.uint64(0x7f)
+    pos = np.arange(width)
+    groups |= np.where(pos < sizes[:, None] - 1, np.uint64(0x80), np.uint64(0))
+    return groups[pos < sizes[:, None]].astype(np.uint8).tobytes()
+
+
+def varint_unpack(b, count=None):
+    """
+    Unpacks LEB128 varints. Vectorized.
+    :param b: bytes
+    :param count: amount of values to read, defaults to all
+    :return: numpy array of uint64 and the amount of bytes consumed
+    """
+    b = np.frombuffer(b, dtype=np.uint8)
+    ends = np.flatnonzero(b < 0x80)
+    if count is not None:
+        if len(ends) < count:
+            raise CodecError("Truncated varint data")
+        ends = ends[:count]
+    if len(ends) == 0:
+        return np.zeros(0, dtype=np.uint64), 0
+
+    used = int(ends[-1]) + 1
+    b = b[:used].astype(np.uint64)
+    starts = np.empty(len(ends), dtype=np.int64)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    pos = np.arange(used) - np.repeat(starts, ends - starts + 1)
+    shifted = (b & np.uint64(0x7f)) << (pos.astype(np.uint64) * np.uint64(7))
+    return np.bitwise_or.reduceat(shifted, starts), used
+
+
+################################################################
+#   Hex tokens as used in the telegrams
+
+_HEX_VALUES = np.full(256, -1, dtype=np.int64)
+for _i, _c in enumerate(b"0123456789ABCDEF"):
+    _HEX_VALUES[_c] = _i
+    _HEX_VALUES[bytes([_c]).lower()[0]] = _i
+_HEX_DIGITS = np.frombuffer(b"0123456789ABCDEF", dtype=np.uint8)
+
+
+def hex_parse(tokens):
+    """
+    Parses a list of hex strings like scan.rssi to integers. Vectorized.
+    :param tokens: list of hex strings
+    :return: numpy array of int64
+    """
+    if len(tokens) == 0:
+        return np.zeros(0, dtype=np.int64)
+    chars = np.frombuffer(" ".join(tokens).encode("ascii"), dtype=np.uint8)
+    digits = _HEX_VALUES[chars]
+    space = chars == ord(" ")
+    if np.any(digits[~space] < 0) or np.any(space[1:] & space[:-1]) or space[0] or space[-1]:
+        raise ValueError("Invalid hex token")
+
+    ends = np.append(np.flatnonzero(space) - 1, len(chars) - 1)
+    starts = np.insert(ends[:-1] + 2, 0, 0)
+    token = np.cumsum(space)
+    # position of every digit counted from the end of its token
+    power = ends[token] - np.arange(len(chars))
+    values = np.where(space, 0, digits << (4 * np.maximum(power, 0)))
+    return np.add.reduceat(values, starts)
+
+
+def hex_join(values):
+    """
+    Formats integers as space separated upper case hex string like scan.raw_distances. Vectorized.
+    :param values: array of non-negative integers
+    :return: string
+    """
+    values = np.asarray(values, dtype=np.int64)
+    if values.size == 0:
+        return ""
+    width = max(1, (int(values.max()).bit_length() + 3) // 4)
+    shifts = 4 * np.arange(width - 1, -1, -1)
+    nibbles = (values[:, None] >> shifts) & 0xf
+    # number of significant digits, at least one for 0
+    length = width - np.argmax(nibbles != 0, axis=1)
+    length[values == 0] = 1
+
+    chars = np.empty((values.size, width + 1), dtype=np.uint8)
+    chars[:, :width] = _HEX_DIGITS[nibbles]
+    chars[:, width] = ord(" ")
+    keep = np.ones(chars.shape, dtype=bool)
+    keep[:, :width] = np.arange(width) >= (width - length)[:, None]
+    return chars[keep].tobytes()[:-1].decode("ascii")
+
+
+################################################################
+#   Channel encoding
+
+def _encode_channel(values, prev):
+    values = np.asarray(values, dtype=np.int64)
+    spatial = zigzag(np.diff(values, prepend=0))
+    mode, residual = MODE_SPATIAL, spatial
+
+    if prev is not None and len(prev) == len(values):
+        temporal = zigzag(values - prev)
+        if _varint_sizes(temporal).sum() < _varint_sizes(spatial).sum():
+            mode, residual = MODE_TEMPORAL, temporal
+
+    return bytes([mode]) + varint_pack([len(values)]) + varint_pack(residual)
+
+
+def _decode_channel(buf, offset, prev):
+    mode = buf[offset]
+    (n,), used = varint_unpack(buf[offset + 1:offset + 11], 1)
+    offset += 1 + used
+    residual, used = varint_unpack(buf[offset:], int(n))
+    offset += used
+    residual = unzigzag(residual)
+
+    if mode == MODE_SPATIAL:
+        values = np.cumsum(residual)
+    elif mode == MODE_TEMPORAL:
+        if prev is None or len(prev) != n:
+            raise CodecError("Frame is delta encoded against a previous frame that was not decoded")
+        values = prev + residual
+    else:
+        raise CodecError(f"Unknown channel mode {mode}")
+    return values, offset
+
+
+def _set_list(scan, name, value):
+    # EasyDict.__setattr__ scans lists element by element for nested dicts, too slow for beam data
+    dict.__setattr__(scan, name, value)
+    dict.__setitem__(scan, name, value)
+
+
+def _pack_str(s):
+    s = b"" if s is None else s.encode("utf-8")
+    return bytes([len(s)]) + s
+
+
+def _unpack_str(buf, offset):
+    n = buf[offset]
+    s = buf[offset + 1:offset + 1 + n].decode("utf-8")
+    return s or None, offset + 1 + n
+
+
+################################################################
+#   Encoder / decoder
+
+class ScanEncoder:
+    """
+    Stateful encoder for a stream of scans returned by LiDAR.scan().
+    Frames are delta encoded against the previous frame, a keyframe is forced every keyframe_interval frames
+    so decoders can join a running stream.
+    """
+
+    def __init__(self, backend="zlib", keyframe_interval=50):
+        """
+        :param backend: compression backend, one of BACKENDS
+        :param keyframe_interval: maximum amount of frames between two keyframes
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend}, choose from {list(BACKENDS)}")
+        self.backend = backend
+        self.keyframe_interval = keyframe_interval
+        self._since_key = None
+        self._prev_dist = None
+        self._prev_rssi = None
+
+    def reset(self):
+        """
+        Forces the next frame to be a keyframe.
+        """
+        self._since_key = None
+
+    def encode(self, scan):
+        """
+        :param scan: dict returned by LiDAR.scan()
+        :return: bytes of a single frame
+        """
+        backend_id, compress, _ = BACKENDS[self.backend]
+
+        keyframe = self._since_key is None or self._since_key >= self.keyframe_interval
+        if keyframe:
+            self._since_key = 0
+            self._prev_dist = self._prev_rssi = None
+        self._since_key += 1
+
+        header = [-1 if scan.get(f) is None else int(scan[f]) for f in HEADER_FIELDS]
+        header.append(round(scan.scan_freq * 100))
+        header.append(round(scan.meas_freq * 100))
+
+        host_time = scan.get("host_time")
+        body = [
+            struct.pack(">d", float("nan") if host_time is None else host_time),
+            varint_pack(zigzag(header)),
+            struct.pack(">ff", scan.dist_scale_fact or 0.0, scan.dist_scale_fact_offset or 0.0),
+            _pack_str(scan.dist_label),
+            _pack_str(scan.rssi_label),
+        ]
+
+        dist = np.zeros(0, dtype=np.int64) if scan.distances is None else np.asarray(scan.distances, dtype=np.int64)
+        body.append(_encode_channel(dist, self._prev_dist))
+        self._prev_dist = dist
+
+        if scan.rssi is None:
+            rssi = np.zeros(0, dtype=np.int64)
+        else:
+            rssi = hex_parse(scan.rssi)
+        body.append(_encode_channel(rssi, self._prev_rssi))
+        self._prev_rssi = rssi
+
+        flags = backend_id | (FLAG_KEYFRAME if keyframe else 0)
+        return bytes([flags]) + compress(b"".join(body))
+
+
+class ScanDecoder:
+    """
+    Stateful decoder for frames produced by ScanEncoder. Returns dicts in the format of LiDAR.scan().
+    Delta frames received before the first keyframe raise CodecError, see skip_to_keyframe.
+    """
+
+    def __init__(self, skip_to_keyframe=False):
+        """
+        :param skip_to_keyframe: return None for delta frames instead of raising until a keyframe is decoded
+        """
+        self.skip_to_keyframe = skip_to_keyframe
+        self._prev_dist = None
+        self._prev_rssi = None
+
+    def decode(self, frame):
+        """
+        :param frame: bytes of a single frame
+        :return: dict in the format of LiDAR.scan(), or None when waiting for a keyframe
+        """
+        if len(frame) == 0:
+            raise CodecError("Empty frame")
+        flags = frame[0]
+        backend = _BACKEND_IDS.get(flags & FLAG_BACKEND)
+        if backend is None:
+            raise CodecError(f"Unknown backend id {flags & FLAG_BACKEND}")
+
+        if flags & FLAG_KEYFRAME:
+            self._prev_dist = self._prev_rssi = None
+        elif self._prev_dist is None and self.skip_to_keyframe:
+            return None
+
+        try:
+            buf = BACKENDS[backend][2](frame[1:])
+        except (zlib.error, lzma.LZMAError, OSError, EOFError, ValueError) as e:
+            self._prev_dist = self._prev_rssi = None
+            raise CodecError(f"Corrupt frame, decompression failed: {e}") from e
+
+        try:
+            return self._parse(buf)
+        except CodecError:
+            self._prev_dist = self._prev_rssi = None
+            raise
+        except (struct.error, IndexError, ValueError, UnicodeDecodeError) as e:
+            self._prev_dist = self._prev_rssi = None
+            raise CodecError(f"Corrupt frame: {e}") from e
+
+    def _parse(self, buf):
+        scan = edict()
+        host_time = struct.unpack_from(">d", buf)[0]
+        offset = 8
+        header, used = varint_unpack(buf[offset:offset + 10 * (len(HEADER_FIELDS) + 2)], len(HEADER_FIELDS) + 2)
+        header = unzigzag(header).tolist()
+        offset += used
+        scale, scale_offset = struct.unpack_from(">ff", buf, offset)
+        offset += 8
+        dist_label, offset = _unpack_str(buf, offset)
+        rssi_label, offset = _unpack_str(buf, offset)
+
+        dist, offset = _decode_channel(buf, offset, self._prev_dist)
+        rssi, offset = _decode_channel(buf, offset, self._prev_rssi)
+        if offset != len(buf):
+            raise CodecError(f"Frame has {len(buf) - offset} bytes of trailing data")
+        self._prev_dist = dist
+        self._prev_rssi = rssi
+
+        for field, value in zip(HEADER_FIELDS, header):
+            scan[field] = None if value == -1 else value
+        if host_time == host_time:  # not NaN
+            scan.host_time = host_time
+        scan.cmd_type = "sRA"
+        scan.cmd = "LMDscandata"
+        scan.scan_freq = header[-2] / 100
+        scan.meas_freq = header[-1] / 100
+
+        if dist_label is not None:
+            scan.dist_label = dist_label
+            scan.dist_scale_fact = scale
+            scan.dist_scale_fact_offset = scale_offset
+            scan.dist_data_amnt = len(dist)
+            scan.dist_end = None if scan.dist_start is None else scan.dist_start + 6 + len(dist)
+            _set_list(scan, "distances", dist.tolist())
+            scan.raw_distances = hex_join(dist)
+        else:
+            scan.dist_label = scan.dist_scale_fact = scan.dist_scale_fact_offset = None
+            scan.dist_data_amnt = scan.dist_end = scan.distances = scan.raw_distances = None
+
+        if rssi_label is not None:
+            scan.rssi_label = rssi_label
+            scan.rssi_data_amnt = len(rssi)
+            scan.rssi_end = None if scan.rssi_start is None else scan.rssi_start + 6 + len(rssi)
+            _set_list(scan, "rssi", hex_join(rssi).split())
+        else:
+            scan.rssi_label = scan.rssi_data_amnt = scan.rssi_end = scan.rssi = None
+
+        return scan
+
+
+################################################################
+#   Stream framing
+
+def write_frame(f, frame):
+    """
+    Writes a length prefixed frame to a binary file-like object.
+    """
+    f.write(struct.pack(">I", len(frame)))
+    f.write(frame)
+
+
+def read_frame(f):
+    """
+    Reads a length prefixed frame from a binary file-like object.
+    :return: bytes, or None at the end of the stream
+    """
+    prefix = f.read(4)
+    if len(prefix) < 4:
+        return None
+    n = struct.unpack(">I", prefix)[0]
+    frame = f.read(n)
+    if len(frame) < n:
+        raise CodecError("Truncated frame at end of stream")
+    return frame
+
+
+def iter_frames(f):
+    """
+    Iterates over all length prefixed frames of a binary file-like object.
+    """
+    while True:
+        frame = read_frame(f)
+        if frame is None:
+            return
+        yield frame
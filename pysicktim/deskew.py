@@ -0,0 +1,164 @@
+### Motion distortion compensation
+#
+#   The beams of one sweep are measured at different times. When the sensor moves during the sweep
+#   the resulting point cloud is skewed. deskew() transforms every point with the sensor pose at the
+#   time its beam was measured into the sensor frame at a single reference time.
+#   Poses are 2D: x, y in meters and yaw in radians.
+from collections import deque
+import logging
+
+import numpy as np
+
+from .timing import beam_offsets
+
+log = logging.getLogger(__name__)
+
+
+def angles(scan):
+    """
+    Returns the angle of every distance beam in radians.
+    :param scan: dict returned by LiDAR.scan()
+    :return: numpy array
+    """
+    n = scan.dist_data_amnt
+    deg = (scan.dist_start_ang + np.arange(n) * scan.dist_angle_res) / 10000
+    return np.deg2rad(deg)
+
+
+def points(scan):
+    """
+    Converts the distances of a scan to cartesian points in the sensor frame.
+    Beams without echo (distance 0) are returned as NaN.
+    Raises ValueError for scans without distance channel.
+    :param scan: dict returned by LiDAR.scan()
+    :return: (n, 2) numpy array in meters
+    """
+    if scan.distances is None:
+        raise ValueError("Scan has no distance channel")
+    dist = np.asarray(scan.distances, dtype=np.float64)
+    valid = dist > 0
+    dist = (dist * scan.dist_scale_fact + scan.dist_scale_fact_offset) / 1000
+    dist[~valid] = np.nan
+
+    ang = angles(scan)
+    return np.stack((dist * np.cos(ang), dist * np.sin(ang)), axis=-1)
+
+
+class PoseBuffer:
+    """
+    Keeps a history of timestamped odometry poses and interpolates them linearly.
+    Timestamps need to be in the same clock as the beam times, e.g. time.monotonic() combined with ClockSync.
+    """
+
+    def __init__(self, maxlen=1000):
+        self.poses = deque(maxlen=maxlen)
+        self._history = None
+
+    def __len__(self):
+        return len(self.poses)
+
+    def add(self, t, x, y, yaw):
+        """
+        Adds an odometry pose. Poses need to be added in chronological order.
+        """
+        if self.poses and t < self.poses[-1][0]:
+            raise ValueError(f"Pose at {t} is older than the latest pose at {self.poses[-1][0]}")
+        self.poses.append((t, x, y, yaw))
+        self._history = None
+
+    def _arrays(self):
+        # rebuilt only after poses were added, interpolation is called for every scan
+        if self._history is None:
+            t, x, y, yaw = np.asarray(self.poses, dtype=np.float64).T
+            self._history = t, x, y, np.unwrap(yaw)
+        return self._history
+
+    def interpolate(self, times):
+        """
+        Returns the poses at the given times. Times outside the history are clamped to the first and last pose.
+        Raises ValueError when no time lies within the history, e.g. for beam offsets instead of beam times.
+        :param times: array of timestamps
+        :return: x, y, yaw numpy arrays
+        """
+        if not self.poses:
+            raise RuntimeError("PoseBuffer is empty, add poses first")
+
+        t, x, y, yaw = self._arrays()
+        times = np.asarray(times, dtype=np.float64)
+        if times.size and (times.max() < t[0] or times.min() > t[-1]):
+            raise ValueError(f"Times {times.min()} to {times.max()} lie outside the pose history {t[0]} to {t[-1]}")
+        if times.size and (times.min() < t[0] or times.max() > t[-1]):
+            log.debug("Times exceed the pose history, clamping to the nearest pose")
+
+        return np.interp(times, t, x), np.interp(times, t, y), np.interp(times, t, yaw)
+
+
+class ConstantVelocity:
+    """
+    Pose source for a sensor moving with a constant velocity (twist) in its own frame.
+    The pose is the identity at t0.
+    """
+
+    def __init__(self, vx, vy, omega, t0=0.0):
+        """
+        :param vx: forward velocity in m/s
+        :param vy: lateral velocity in m/s
+        :param omega: yaw rate in rad/s
+        :param t0: time of the identity pose
+        """
+        self.vx = vx
+        self.vy = vy
+        self.omega = omega
+        self.t0 = t0
+
+    def interpolate(self, times):
+        dt = np.asarray(times, dtype=np.float64) - self.t0
+        yaw = self.omega * dt
+
+        if abs(self.omega) < 1e-9:
+            return self.vx * dt, self.vy * dt, yaw
+
+        # exact integration of the twist on SE(2)
+        s = np.sin(yaw) / self.omega
+        c = (1 - np.cos(yaw)) / self.omega
+        x = s * self.vx - c * self.vy
+        y = c * self.vx + s * self.vy
+        return x, y, yaw
+
+
+def deskew(scan, poses, times=None, ref_time=None):
+    """
+    Compensates the motion of the sensor during a scan.
+
+    :param scan: dict returned by LiDAR.scan()
+    :param poses: pose source with an interpolate(times) method, e.g. PoseBuffer or ConstantVelocity
+    :param times: time of every beam, e.g. ClockSync.beam_times(scan). Required for a PoseBuffer.
+        Defaults to the beam offsets relative to the start of the scan, based on the scan frequency.
+    :param ref_time: time the points are transformed to, defaults to the time of the last beam
+    :return: (n, 2) numpy array of corrected points in meters, beams without echo are NaN
+    """
+    pts = points(scan)
+    if len(pts) == 0:
+        return pts
+    if times is None:
+        times = beam_offsets(scan, len(pts))
+    times = np.asarray(times, dtype=np.float64)
+    if ref_time is None:
+        ref_time = times[-1]
+
+    # the reference pose is interpolated together with the beams, the last element
+    x, y, yaw = poses.interpolate(np.append(times, ref_time))
+    rx, ry, ryaw = x[-1], y[-1], yaw[-1]
+    x, y, yaw = x[:-1], y[:-1], yaw[:-1]
+
+    # relative pose of every beam with respect to the reference pose
+    cr, sr = np.cos(ryaw), np.sin(ryaw)
+    dx = x - rx
+    dy = y - ry
+    tx = cr * dx + sr * dy
+    ty = -sr * dx + cr * dy
+    dyaw = yaw - ryaw
+
+    c, s = np.cos(dyaw), np.sin(dyaw)
+    px, py = pts[:, 0], pts[:, 1]
+    return np.stack((c * px - s * py + tx, s * px + c * py + ty), axis=-1)
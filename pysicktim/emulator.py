@@ -0,0 +1,266 @@
+### Local device emulator replaying recorded scans
+#
+#   Emulator listens like a TiM5xx on a local TCP port and answers CoLa-A telegrams, so LiDAR
+#   objects and tools can be tested against a recording instead of a device. LMDscandata
+#   requests are answered with the latest recorded scan that is due at the replay clock, like the
+#   device returns its latest scan. Polling faster than the scan frequency returns the same scan again.
+import socket
+import struct
+import time
+import logging
+
+import numpy as np
+from easydict import EasyDict as edict
+
+from .pysicktim import parse_scan
+from .codec import ScanDecoder
+
+log = logging.getLogger(__name__)
+
+
+def _hex(i):
+    return "%X" % i
+
+
+def telegram(scan):
+    """
+    Builds an LMDscandata telegram from a parsed scan. Inverse of parse_scan().
+    :param scan: dict returned by LiDAR.scan()
+    :return: telegram string without opening and closing bytes
+    """
+    parts = [
+        "sRA", "LMDscandata",
+        _hex(scan.version), _hex(scan.device_num), _hex(scan.serial_num),
+        _hex(scan.device_stat >> 8), _hex(scan.device_stat & 0xff),
+        _hex(scan.telegram_cnt), _hex(scan.scan_cnt), _hex(scan.uptime), _hex(scan.trans_time),
+        _hex(scan.input_stat >> 8), _hex(scan.input_stat & 0xff),
+        _hex(scan.output_stat >> 8), _hex(scan.output_stat & 0xff),
+        _hex(scan.layer_ang), _hex(round(scan.scan_freq * 100)), _hex(round(scan.meas_freq * 100)),
+        "0",    # encoder data is not reproduced
+    ]
+
+    if scan.distances is not None:
+        parts += [
+            "1", scan.dist_label,
+            struct.pack(">f", scan.dist_scale_fact).hex().upper(),
+            struct.pack(">f", scan.dist_scale_fact_offset).hex().upper(),
+            _hex(scan.dist_start_ang & 0xffffffff), _hex(scan.dist_angle_res), _hex(len(scan.distances)),
+        ]
+        parts += [_hex(d) for d in scan.distances]
+    else:
+        parts.append("0")
+
+    if scan.rssi is not None:
+        parts += [
+            "1", scan.rssi_label,
+            _hex(scan.rssi_scale_fact), _hex(scan.rssi_scale_fact_offset),
+            _hex(scan.rssi_start_ang & 0xffffffff), _hex(scan.rssi_angle_res), _hex(len(scan.rssi)),
+        ]
+        parts += scan.rssi
+    else:
+        parts.append("0")
+
+    parts += ["0", "0", "0", "0", "0"]     # position, name, comment, time, event
+    return " ".join(parts)
+
+
+def synthetic_scans(count=1, n=811, seed=0):
+    """
+    Builds scans of a static scene with measurement noise and 5 % beams without echo, e.g. for
+    benchmarks and tests without a recording. The uptime counter wraps around after the first scan.
+    :param count: amount of consecutive scans at 15 Hz
+    :param n: amount of beams per scan
+    :param seed: seed of the noise
+    :return: list of dicts as returned by LiDAR.scan()
+    """
+    rng = np.random.default_rng(seed)
+    base = (3000 + 1000 * np.sin(np.linspace(0, 6, n))).astype(int)
+    scans = []
+    for k in range(count):
+        dist = base + rng.integers(-15, 16, n)
+        dist[rng.random(n) < 0.05] = 0
+        rssi = rng.integers(0, 256, n)
+        scan = parse_scan(telegram(edict(
+            version=1, device_num=1, serial_num=0x1234567, device_stat=0, telegram_cnt=k, scan_cnt=k,
+            uptime=(2 ** 32 - 100 + k * 66667) % 2 ** 32, trans_time=k * 66667 + 1400,
+            input_stat=0, output_stat=0x0102, layer_ang=0, scan_freq=15.0, meas_freq=1.62,
+            dist_label="DIST1", dist_scale_fact=1.0, dist_scale_fact_offset=0.0,
+            dist_start_ang=-450000, dist_angle_res=3333, distances=dist.tolist(),
+            rssi_label="RSSI1", rssi_scale_fact=0x3F800000, rssi_scale_fact_offset=0,
+            rssi_start_ang=-450000, rssi_angle_res=3333, rssi=["%X" % r for r in rssi],
+        )))
+        scan.host_time = 123.5 + k / 15
+        scans.append(scan)
+    return scans
+
+
+class Emulator:
+    """
+    Serves recorded frames to one LiDAR client at a time.
+    """
+
+    name = "Emulator"
+
+    def __init__(self, frames, address=("127.0.0.1", 2111), speed=1.0, loop=False):
+        """
+        :param frames: list of encoded frames, see codec.ScanEncoder
+        :param address: (host, port) to listen on
+        :param speed: replay speed factor, 2.0 replays twice as fast as recorded
+        :param loop: restart the recording at its end, otherwise the connection is closed
+        """
+        if not frames:
+            raise ValueError("Nothing to replay, no frames given")
+        self.frames = frames
+        self.address = address
+        self.speed = speed
+        self.loop = loop
+        self.served = 0
+        self.finished = False
+        self._server = None
+        self._rewind()
+
+    def _rewind(self):
+        self._decoder = ScanDecoder()
+        self._index = -1
+        self._start = None
+        self._current = self._decode_next()
+        self._t0 = self._current[1]
+        self._next = self._decode_next()
+
+    def _decode_next(self):
+        """
+        Decodes the next frame, frames depend on their predecessor so they are decoded in order.
+        :return: (scan, recording time) tuple, or None at the end of the recording
+        """
+        self._index += 1
+        if self._index >= len(self.frames):
+            return None
+        scan = self._decoder.decode(self.frames[self._index])
+        t = scan.get("host_time")
+        if t is None:
+            t = self._index / (scan.scan_freq or 15)
+        return scan, t
+
+    def _due(self, entry):
+        return self._start + (entry[1] - self._t0) / self.speed
+
+    def next_scan(self):
+        """
+        Returns the latest recorded scan that is due at the replay clock.
+        :return: parsed scan, or None at the end of the recording
+        """
+        now = time.monotonic()
+        if self._start is None:
+            self._start = now
+            return self._serve()
+
+        # skip the scans the client was too slow to poll
+        while self._next is not None and self._due(self._next) <= now:
+            self._current, self._next = self._next, self._decode_next()
+
+        # the last scan is served for one scan period before the recording ends
+        if self._next is None and now >= self._due(self._current) + self._period():
+            if not self.loop:
+                return None
+            self._rewind()
+            self._start = now
+
+        return self._serve()
+
+    def _period(self):
+        return 1 / ((self._current[0].scan_freq or 15) * self.speed)
+
+    def _serve(self):
+        self.served += 1
+        return self._current[0]
+
+    def respond(self, cmd):
+        """
+        Returns the answer to a CoLa-A command, None closes the connection.
+        """
+        parts = cmd.split()
+        if not parts:
+            return "sFA 5"
+        name = parts[1] if len(parts) > 1 else ""
+
+        if cmd == "sRN LMDscandata":
+            scan = self.next_scan()
+            if scan is None:
+                self.finished = True
+                return None
+            return telegram(scan)
+
+        answers = {
+            "sRN LocationName": f"sRA LocationName {len(self.name):X} {self.name}",
+            "sRN DeviceIdent": f"sRA DeviceIdent {len(self.name):X} {self.name} 5 V1.00",
+            "sRN DItype": f"sRA DItype {len(self.name):X} {self.name}",
+            "sRN SCdevicestate": "sRA SCdevicestate 1",
+            "sRN FirmwareVersion": "sRA FirmwareVersion 5 V1.00",
+        }
+        if cmd in answers:
+            return answers[cmd]
+        if parts[0] == "sMN" and name in ("SetAccessMode", "Run"):
+            return f"sAN {name} 1"
+        if parts[0] == "sMN" and name in ("LMCstartmeas", "LMCstopmeas"):
+            return f"sAN {name} 0"
+        if parts[0] == "sWN":
+            return f"sWA {name}"
+        if parts[0] == "sMN":
+            return "sFA 2"     # Sopas_Error_METHODIN_UNKNOWNINDEX
+        return "sFA 3"         # Sopas_Error_VARIABLE_UNKNOWNINDEX
+
+    def _handle(self, conn):
+        buf = b''
+        while True:
+            chunk = conn.recv(4096)
+            if chunk == b'':
+                return
+            buf += chunk
+            while b"\x03" in buf:
+                msg, buf = buf.split(b"\x03", 1)
+                cmd = msg[msg.find(b"\x02") + 1:].decode("utf-8")
+                answer = self.respond(cmd)
+                if answer is None:
+                    return
+                conn.sendall(b"\x02" + answer.encode("utf-8") + b"\x03")
+
+    def open(self):
+        """
+        Binds the server socket, address is updated with the bound port.
+        """
+        if self._server is None:
+            self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._server.bind(self.address)
+            self._server.listen()
+            self.address = self._server.getsockname()
+            log.info(f"Emulating device on {self.address[0]}:{self.address[1]}")
+
+    def serve_forever(self):
+        """
+        Accepts clients one after another until the recording is finished or interrupted.
+        """
+        self.open()
+        try:
+            while not self.finished:
+                try:
+                    conn, peer = self._server.accept()
+                except OSError:
+                    break
+                log.info(f"Client {peer} connected")
+                with conn:
+                    try:
+                        self._handle(conn)
+                    except OSError as e:
+                        log.info(f"Client {peer} disconnected: {e}")
+        finally:
+            self.stop()
+
+    def stop(self):
+        if self._server is not None:
+            try:
+                self._server.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._server.close()
+            self._server = None
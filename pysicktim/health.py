@@ -0,0 +1,48 @@
+### Per-frame health summary
+#
+#   Cheap enough to run on every scan, so sensors can be monitored from the scan stream itself
+#   without polling device state separately.
+import numpy as np
+
+from .pysicktim import decode_device_status, device_status_bits
+
+
+def invalid_ratio(scan):
+    """
+    Returns the fraction of beams without a valid distance (no echo, reported as 0).
+    :param scan: dict returned by LiDAR.scan()
+    :return: float between 0 and 1, None when the scan has no distance channel
+    """
+    if scan.distances is None or len(scan.distances) == 0:
+        return None
+    dist = np.asarray(scan.distances)
+    return float(np.count_nonzero(dist == 0) / dist.size)
+
+
+def health(scan, max_invalid=0.5):
+    """
+    Summarizes the health of a scan.
+    :param scan: dict returned by LiDAR.scan()
+    :param max_invalid: fraction of invalid beams above which the sensor is considered degraded
+    :return: dict with the decoded device status, invalid_ratio and degraded.
+        invalid_ratio is None (unknown) for scans without distance channel, which does not count as degraded.
+    """
+    summary = decode_device_status(scan.device_stat)
+    summary.invalid_ratio = invalid_ratio(scan)
+    summary.degraded = (
+        not summary.ok
+        or (summary.invalid_ratio is not None and summary.invalid_ratio > max_invalid)
+    )
+    return summary
+
+
+def status_names(summary):
+    """
+    Returns the names of the status bits that are set, e.g. for logging.
+    :param summary: dict returned by health() or decode_device_status()
+    :return: list of strings, empty when the device is ok
+    """
+    names = [name for name in device_status_bits.values() if summary[name]]
+    if summary.unknown:
+        names.append(f"unknown_{summary.unknown:X}")
+    return names
@@ -0,0 +1,76 @@
+### Polling paced by the scan frequency
+#
+#   sRN LMDscandata returns the latest completed scan, polling faster than the scan frequency
+#   returns the same scan again. ScanPoller waits until the next scan is due before polling and
+#   compares the scan counter of the raw telegram, so repeated scans are never parsed.
+import time
+import logging
+
+from .pysicktim import parse_scan, scan_counter
+
+log = logging.getLogger(__name__)
+
+
+class ScanPoller:
+    """
+    Returns every new scan of a LiDAR once.
+    """
+
+    def __init__(self, lidar, retry=0.1, default_freq=15.0):
+        """
+        :param lidar: opened LiDAR object
+        :param retry: fraction of the scan period to wait before polling again after a repeated scan.
+            The next scan is polled this fraction early, so the polls stay close behind the scans.
+        :param default_freq: scan frequency in Hz assumed for scans that do not report one
+        """
+        self.lidar = lidar
+        self.retry = retry
+        self.default_freq = default_freq
+        self.polls = 0
+        self.duplicates = 0
+        self.last_cnt = None
+        self.rtt = None
+        self._period = 1 / default_freq
+        self._due = None
+
+    def reset(self):
+        """
+        Polls immediately on the next call, e.g. after reconnecting.
+        """
+        self._due = None
+
+    def _wait(self):
+        if self._due is not None:
+            delay = self._due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def poll(self):
+        """
+        Blocks until the device returns a scan that was not returned before.
+        Errors of the device and of parsing are raised, the scan is skipped by the next call.
+        :return: dict returned by parse_scan() with host_time
+        """
+        while True:
+            self._wait()
+            sent = time.monotonic()
+            data = self.lidar.scan(raw=True)
+            host_time = time.monotonic()
+            self.polls += 1
+            self.rtt = host_time - sent
+
+            cnt = scan_counter(data)
+            if cnt == self.last_cnt:
+                self.duplicates += 1
+                self._due = host_time + self.retry * self._period
+                continue
+
+            self.last_cnt = cnt
+            try:
+                scan = parse_scan(data)
+                self._period = 1 / (scan.scan_freq or self.default_freq)
+            finally:
+                # the next scan completes one period after this one, measured from the request
+                self._due = sent + (1 - self.retry) * self._period
+            scan.host_time = host_time  # time.monotonic() at reception, see timing.ClockSync
+            return scan
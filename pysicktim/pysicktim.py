@@ -66,7 +66,7 @@ error_codes=[
 error_descriptions = {
     "Sopas_Error_METHODIN_ACCESSDENIED": "Wrong userlevel, access to method not allowed",
     "Sopas_Error_METHODIN_UNKNOWNINDEX": "Trying to access a method with an unknown Sopas index",
-    "Sopas_Error_scandatacfgVARIABLE_UNKNOWNINDEX": "Trying to access a variable with an unknown Sopas index",
+    "Sopas_Error_VARIABLE_UNKNOWNINDEX": "Trying to access a variable with an unknown Sopas index",
     "Sopas_Error_LOCALCONDITIONFAILED": "Local condition violated, e.g. giving a value that exceeds the minimum or maximum allowed value for this variable",
     "Sopas_Error_INVALID_DATA": "Invalid data given for variable, this errorcode is deprecated (is not used anymore).",
     "Sopas_Error_UNKNOWN_ERROR": "An error with unknown reason occurred, this errorcode is deprecated.",
@@ -92,6 +92,27 @@ error_descriptions = {
     "Sopas_Error_ComplexArraysNotSupported": "Device was built with „ComplexArraysSuppressed“ because the compiler does not allow recursions. But now a complex dataay was found. This is an internal error that should never happen in a released device."
     }
 
+# Bits of the device status word in LMDscandata
+device_status_bits = {
+    0x0001: "error",
+    0x0002: "contamination_warning",
+    0x0004: "contamination_error",
+    }
+
+def decode_device_status(word):
+    """
+    Decodes the device status word of a scan
+    :param word: scan.device_stat
+    :return: dict with a boolean per status bit, ok and the bits that are not known
+    """
+    status = edict()
+    status.raw = word
+    status.ok = word == 0
+    for bit, name in device_status_bits.items():
+        status[name] = bool(word & bit)
+    status.unknown = word & ~sum(device_status_bits)
+    return status
+
 def remove_control_characters(s):
     s = "".join(ch for ch in s if unicodedata.category(ch)[0]!="C")
     return s
@@ -120,8 +141,13 @@ def float32(i):
 
 def check_error(s):
     if s[0:3] == "sFA":
-        error_code = error_codes[int(s[-1],16)]
-        error_description = error_descriptions[error_code]
+        code = int(s.split()[-1],16)
+        if code < len(error_codes):
+            error_code = error_codes[code]
+            error_description = error_descriptions.get(error_code, "No description available.")
+        else:
+            error_code = f"Sopas_Error_{code:X}"
+            error_description = "Unknown error code."
         raise LidarException(error_code,error_description)
         # return [error_code,error_description]
     else:
@@ -135,6 +161,105 @@ def parse_str(d):
         d = d[len(d)-1]
         return d
 
+def scan_counter(data):
+    """
+    Reads the scan counter of an LMDscandata telegram without parsing the scan
+    :param data: telegram string without opening and closing bytes
+    :return: int, the same as parse_scan(data).scan_cnt
+    """
+    return int(data.split(None, 9)[8], 16)
+
+def parse_scan(data):
+    """
+    Parses an LMDscandata telegram as returned by LiDAR.read()
+    :param data: telegram string without opening and closing bytes
+    :return: dict with scan information, see LiDAR.scan()
+    """
+    scan = edict()
+
+    scan.dist_start = None
+    scan.rssi_start = None
+
+    log.debug(f"Scanresponse: {data}")
+
+    data = data.split()
+
+    for index, item in enumerate(data):
+        if "DIST" in item and scan.dist_start == None:
+            scan.dist_start = index
+
+        if "RSSI" in item:
+            scan.rssi_start = index
+
+    scan.telegram_len = len(data)
+    scan.cmd_type = data[0]
+    scan.cmd = data[1]
+    scan.version = int(data[2], 16)
+    scan.device_num = int(data[3], 16)
+    scan.serial_num = int(data[4], 16)
+    scan.device_stat = int(data[5], 16) << 8 | int(data[6], 16)  # both bytes, see decode_device_status
+    scan.telegram_cnt = int(data[7], 16)
+    scan.scan_cnt = int(data[8], 16)
+    scan.uptime = int(data[9], 16)
+    scan.trans_time = int(data[10], 16)
+    scan.input_stat = int(data[11], 16) << 8 | int(data[12], 16)  # Takes both bytes into account
+    scan.output_stat = int(data[13], 16) << 8 | int(data[14], 16)  # Takes both bytes into account
+    scan.layer_ang = int(data[15], 16)
+    scan.scan_freq = int(data[16], 16) / 100
+    scan.meas_freq = int(data[17], 16) / 100  # Math may not be right
+    scan.enc_amount = int(data[18], 16)
+
+    scan.num_16bit_chan = int(data[19], 16)
+
+    if scan.dist_start != None:
+
+        scan.dist_label = data[scan.dist_start]
+        scan.dist_scale_fact = float32(data[scan.dist_start + 1])  # float
+        scan.dist_scale_fact_offset = float32(data[scan.dist_start + 2])  # float
+        scan.dist_start_ang = int32(data[scan.dist_start + 3])  # Int_32
+        scan.dist_angle_res = int(data[scan.dist_start + 4], 16)  # Uint_16
+        scan.dist_data_amnt = int(data[scan.dist_start + 5], 16)  # Uint_16
+        scan.dist_end = (scan.dist_start + 6) + scan.dist_data_amnt
+        scan.distances = hex_to_dec(data[scan.dist_start + 6:scan.dist_end])
+        scan.raw_distances = " ".join(data[scan.dist_start + 6:scan.dist_end])
+
+    else:
+
+        scan.dist_label = None
+        scan.dist_scale_fact = None
+        scan.dist_scale_fact_offset = None
+        scan.dist_start_ang = None
+        scan.dist_angle_res = None
+        scan.dist_data_amnt = None
+        scan.dist_end = None
+        scan.distances = None
+        scan.raw_distances = None
+
+    if scan.rssi_start != None:
+
+        scan.rssi_label = data[scan.rssi_start]
+        scan.rssi_scale_fact = int(data[scan.rssi_start + 1], 16)
+        scan.rssi_scale_fact_offset = int(data[scan.rssi_start + 2], 16)
+        scan.rssi_start_ang = int32(data[scan.rssi_start + 3])  # Int_32
+        scan.rssi_angle_res = int(data[scan.rssi_start + 4], 16)
+        scan.rssi_data_amnt = int(data[scan.rssi_start + 5], 16)
+        scan.rssi_end = (scan.rssi_start + 6) + scan.rssi_data_amnt
+        scan.rssi = data[scan.rssi_start + 6:scan.rssi_end]
+
+    else:
+
+        scan.rssi_label = None
+        scan.rssi_scale_fact = None
+        scan.rssi_scale_fact_offset = None
+        scan.rssi_start_ang = None
+        scan.rssi_angle_res = None
+        scan.rssi_data_amnt = None
+        scan.rssi_end = None
+        scan.rssi = None
+
+    return scan
+
+
 ## LIDAR FUNCTIONS ##
 
 class LiDAR:
@@ -421,94 +546,11 @@ class LiDAR:
     def scan(self, raw=False):    # Get LIDAR Data
         self.send('sRN LMDscandata')
         raw_data = self.read()
-        data = raw_data
-
-        scan = edict()
+        host_time = time.monotonic()
 
         if not raw:
-
-            scan.dist_start = None
-            scan.rssi_start = None
-
-            log.debug(f"Scanresponse: {raw_data}")
-
-            data = data.split()
-
-            for index, item in enumerate(data):
-                if "DIST" in item and scan.dist_start == None:
-                    scan.dist_start = index
-
-                if "RSSI" in item:
-                    scan.rssi_start = index
-
-            scan.telegram_len = len(data)
-            scan.cmd_type = data[0]
-            scan.cmd = data[1]
-            scan.version = int(data[2], 16)
-            scan.device_num = int(data[3], 16)
-            scan.serial_num = int(data[4], 16)
-            scan.device_stat = int(data[6], 16)
-            scan.telegram_cnt = int(data[7], 16)
-            scan.scan_cnt = int(data[8], 16)
-            scan.uptime = int(data[9], 16)
-            scan.trans_time = int(data[10], 16)
-            # scan.input_stat =   int(str(data[11],data[12]),16)    # Takes both bytes into account
-            scan.input_stat = int(data[12], 16)
-            # scan.output_stat =  int(str(data[13],data[14]),16)     # Takes both bytes into account
-            scan.output_stat = int(data[14], 16)
-            scan.layer_ang = int(data[15], 16)
-            scan.scan_freq = int(data[16], 16) / 100
-            scan.meas_freq = int(data[17], 16) / 100  # Math may not be right
-            scan.enc_amount = int(data[18], 16)
-
-            scan.num_16bit_chan = int(data[19], 16)
-
-            if scan.dist_start != None:
-
-                scan.dist_label = data[scan.dist_start]
-                scan.dist_scale_fact = float32(data[scan.dist_start + 1])  # float
-                scan.dist_scale_fact_offset = float32(data[scan.dist_start + 2])  # float
-                scan.dist_start_ang = int32(data[scan.dist_start + 3])  # Int_32
-                scan.dist_angle_res = int(data[scan.dist_start + 4], 16)  # Uint_16
-                scan.dist_data_amnt = int(data[scan.dist_start + 5], 16)  # Uint_16
-                scan.dist_end = (scan.dist_start + 6) + scan.dist_data_amnt
-                scan.distances = hex_to_dec(data[scan.dist_start + 6:scan.dist_end])
-                scan.raw_distances = " ".join(data[scan.dist_start + 6:scan.dist_end])
-
-            else:
-
-                scan.dist_label = None
-                scan.dist_scale_fact = None
-                scan.dist_scale_fact_offset = None
-                scan.dist_start_ang = None
-                scan.dist_angle_res = None
-                scan.dist_data_amnt = None
-                scan.dist_end = None
-                scan.distances = None
-                scan.raw_distances = None
-
-            if scan.rssi_start != None:
-
-                scan.rssi_label = data[20]
-                scan.rssi_scale_fact = int(data[scan.rssi_start + 1], 16)
-                scan.rssi_scale_fact_offset = int(data[scan.rssi_start + 2], 16)
-                scan.rssi_start_ang = int32(data[scan.dist_start + 3])  # Int_32
-                scan.rssi_angle_res = int(data[scan.rssi_start + 4], 16)
-                scan.rssi_data_amnt = int(data[scan.rssi_start + 5], 16)
-                scan.rssi_end = (scan.rssi_start + 6) + scan.rssi_data_amnt
-                scan.rssi = data[scan.rssi_start + 6:scan.rssi_end]
-
-            else:
-
-                scan.rssi_label = None
-                scan.rssi_scale_fact = None
-                scan.rssi_scale_fact_offset = None
-                scan.rssi_start_ang = None
-                scan.rssi_angle_res = None
-                scan.rssi_data_amnt = None
-                scan.rssi_end = None
-                scan.rssi = None
-
+            scan = parse_scan(raw_data)
+            scan.host_time = host_time  # time.monotonic() at reception, see timing.ClockSync
             return scan
         else:
             return raw_data
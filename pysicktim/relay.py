@@ -0,0 +1,323 @@
+### Relay server that republishes one sensor stream to many local clients
+#
+#   The device only handles one command at a time (Sopas_Error_METHODIN_SERVER_BUSY), so a single
+#   Relay holds the device connection, polls and decodes every scan once and fans the encoded
+#   frames out to subscribers over TCP or Unix sockets.
+#
+#   Every subscriber has a bounded queue. A subscriber that can not keep up drops frames, after a
+#   drop it skips delta frames until the next keyframe so its decoder stays consistent.
+#
+#   A lost device connection is reopened with an exponential backoff. Telegrams that can not be
+#   parsed are logged and skipped.
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+import logging
+
+from .pysicktim import LidarException, LidarNotFound
+from .codec import ScanEncoder, ScanDecoder, FLAG_KEYFRAME
+from .poller import ScanPoller
+
+log = logging.getLogger(__name__)
+
+
+def _make_socket(address):
+    if isinstance(address, str):
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    return socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+
+class Subscriber:
+    """
+    Connection to one relay client, sends frames from its own thread.
+    """
+
+    def __init__(self, conn, peer, queue_size):
+        self.conn = conn
+        self.peer = peer
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.sent = 0
+        self.dropped = 0
+        self.connected = True
+        self._need_keyframe = True
+        self._thread = threading.Thread(target=self._send_loop, name=f"relay-subscriber-{peer}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def offer(self, frame):
+        """
+        Queues a frame without blocking. Frames are dropped when the queue is full.
+        :return: True when the frame was queued
+        """
+        keyframe = frame[0] & FLAG_KEYFRAME
+        if self._need_keyframe and not keyframe:
+            self.dropped += 1
+            return False
+        try:
+            self.frames.put_nowait(frame)
+            self._need_keyframe = False
+            return True
+        except queue.Full:
+            self.dropped += 1
+            self._need_keyframe = True
+            return False
+
+    def close(self):
+        if self.connected:
+            self.connected = False
+            try:
+                self.frames.put_nowait(None)
+            except queue.Full:
+                pass
+            try:
+                self.conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.conn.close()
+
+    def _send_loop(self):
+        while self.connected:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            try:
+                self.conn.sendall(struct.pack(">I", len(frame)) + frame)
+                self.sent += 1
+            except OSError:
+                log.info(f"Subscriber {self.peer} disconnected")
+                break
+        self.close()
+
+
+class Relay:
+    """
+    Holds the single device connection and republishes its scans to subscribers.
+    """
+
+    def __init__(self, lidar, address=("127.0.0.1", 2112), backend="none", keyframe_interval=50, queue_size=8,
+                 error_backoff=0.1, max_backoff=5.0, reconnect_attempts=10):
+        """
+        :param lidar: LiDAR object, opened by the relay
+        :param address: (host, port) tuple for TCP or a path for a Unix socket
+        :param backend: compression backend of the frames, see codec.BACKENDS
+        :param keyframe_interval: maximum amount of frames between two keyframes
+        :param queue_size: amount of frames buffered per subscriber before frames are dropped
+        :param error_backoff: seconds to wait before polling again after the device answered with an error,
+            doubled for every failed reconnect
+        :param max_backoff: maximum seconds to wait between two reconnects
+        :param reconnect_attempts: consecutive reconnects without a scan before the relay gives up
+        """
+        self.lidar = lidar
+        self.address = address
+        self.queue_size = queue_size
+        self.encoder = ScanEncoder(backend=backend, keyframe_interval=keyframe_interval)
+        self.subscribers = []
+        self.poller = ScanPoller(lidar)
+        self.error_backoff = error_backoff
+        self.max_backoff = max_backoff
+        self.reconnect_attempts = reconnect_attempts
+        self.frames = 0
+        self.skipped = 0
+        self.running = False
+        self.failed = False
+
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._server = None
+        self._threads = []
+
+    def start(self):
+        """
+        Opens the server socket and the device connection and starts relaying in background threads.
+        """
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+        self._server = _make_socket(self.address)
+        if not isinstance(self.address, str):
+            self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(self.address)
+        self._server.listen()
+        self.address = self._server.getsockname()
+
+        self.lidar.open()
+        self.poller.reset()
+        self.running = True
+        self.failed = False
+        self._stopped.clear()
+        self._threads = [
+            threading.Thread(target=self._accept_loop, name="relay-accept", daemon=True),
+            threading.Thread(target=self._poll_loop, name="relay-poll", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+        log.info(f"Relaying on {self.address}")
+
+    @property
+    def duplicates(self):
+        """
+        Amount of polls that returned an already relayed scan.
+        """
+        return self.poller.duplicates
+
+    def stop(self):
+        self.running = False
+        self._stopped.set()
+        if self._server is not None:
+            try:
+                self._server.shutdown(socket.SHUT_RDWR)   # wakes up accept()
+            except OSError:
+                pass
+            self._server.close()
+            self._server = None
+        for t in self._threads:
+            if t is not threading.current_thread():
+                t.join()
+        with self._lock:
+            for sub in self.subscribers:
+                sub.close()
+            self.subscribers = []
+        self.lidar.close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def serve_forever(self):
+        """
+        Starts the relay and blocks until interrupted or the device is lost.
+        :return: False when the relay gave up reconnecting to the device, True otherwise
+        """
+        self.start()
+        try:
+            # the poll thread ends when the device connection is lost
+            self._threads[1].join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+        return not self.failed
+
+    def publish(self, scan):
+        """
+        Encodes a scan once and offers it to every subscriber.
+        """
+        with self._lock:
+            frame = self.encoder.encode(scan)
+            self.frames += 1
+            self.subscribers = [sub for sub in self.subscribers if sub.connected]
+            for sub in self.subscribers:
+                sub.offer(frame)
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                conn, peer = self._server.accept()
+            except OSError:
+                break
+            sub = Subscriber(conn, peer or "unix", self.queue_size)
+            with self._lock:
+                self.subscribers.append(sub)
+                # let the new subscriber start decoding with the next frame
+                self.encoder.reset()
+            sub.start()
+            log.info(f"Subscriber {sub.peer} connected")
+
+    def _reopen(self):
+        self.lidar.close()
+        try:
+            self.lidar.open()
+            self.poller.reset()
+            log.info("Reconnected to the device")
+        except OSError as e:
+            # the next poll fails with LidarNotFound and counts as another attempt
+            log.warning(f"Reconnect failed: {e}")
+
+    def _poll_loop(self):
+        attempts = 0
+        while self.running:
+            try:
+                scan = self.poller.poll()
+            except LidarException as e:
+                log.warning(f"Scan failed: {e}")
+                self._stopped.wait(self.error_backoff)
+                continue
+            except (ValueError, IndexError, AssertionError) as e:
+                # malformed telegram, the next one is read on its own
+                log.warning(f"Skipping scan that can not be parsed: {e!r}")
+                self.skipped += 1
+                continue
+            except (OSError, RuntimeError, LidarNotFound) as e:
+                if attempts >= self.reconnect_attempts:
+                    log.error(f"Lost device connection: {e}, giving up after {attempts} reconnects")
+                    self.failed = True
+                    break
+                delay = min(self.error_backoff * 2 ** attempts, self.max_backoff)
+                attempts += 1
+                log.warning(f"Lost device connection: {e}, reconnecting in {delay:.2f} s")
+                if self._stopped.wait(delay):
+                    break
+                self._reopen()
+                continue
+
+            attempts = 0
+            self.publish(scan)
+        self.running = False
+
+
+class RelayClient:
+    """
+    Receives scans from a Relay. Mirrors the open(), close() and scan() methods of LiDAR.
+    """
+
+    def __init__(self, address=("127.0.0.1", 2112), socket_timeout=None):
+        self.address = address
+        self.socket_timeout = socket_timeout
+        self.connected = False
+        self.sock = None
+        self.decoder = None
+
+    def open(self):
+        if not self.connected:
+            self.sock = _make_socket(self.address)
+            if self.socket_timeout is not None:
+                self.sock.settimeout(self.socket_timeout)
+            self.sock.connect(self.address)
+            self.decoder = ScanDecoder(skip_to_keyframe=True)
+            self.connected = True
+
+    def close(self):
+        if self.connected:
+            self.sock.close()
+            self.connected = False
+
+    def _recv_exact(self, n):
+        chunks = []
+        while n:
+            chunk = self.sock.recv(n)
+            if chunk == b'':
+                raise RuntimeError("socket connection broken")
+            chunks.append(chunk)
+            n -= len(chunk)
+        return b''.join(chunks)
+
+    def read_frame(self):
+        """
+        Returns the next encoded frame.
+        :return: bytes
+        """
+        if not self.connected:
+            raise LidarNotFound("Relay is not connected!")
+        n = struct.unpack(">I", self._recv_exact(4))[0]
+        return self._recv_exact(n)
+
+    def scan(self):
+        """
+        Returns the next decoded scan, in the format of LiDAR.scan().
+        """
+        while True:
+            scan = self.decoder.decode(self.read_frame())
+            if scan is not None:
+                return scan
@@ -0,0 +1,219 @@
+### Mapping of device clock counters to host time
+#
+#   The TiM5xx reports two microsecond counters in every LMDscandata telegram:
+#       uptime      time at the zero index, before the measurement of the scan starts
+#       trans_time  time at which the complete scan was handed to the output buffer
+#   Both are 32 bit unsigned and wrap around after ~71.6 minutes.
+import time
+import logging
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+COUNTER_WRAP = 2 ** 32      # UDINT counters
+US = 1e-6                   # seconds per device tick
+
+
+def meas_freq_hz(scan):
+    """
+    Returns the measurement (beam) frequency of a parsed scan in Hz.
+    The telegram transmits it in units of 100 Hz, scan() divides the raw value by 100.
+    :param scan: dict returned by LiDAR.scan()
+    :return: float
+    """
+    return scan.meas_freq * 100 * 100
+
+
+def beam_offsets(scan, n=None):
+    """
+    Returns the time offset of every distance beam relative to the zero index (uptime) in seconds.
+    Uses meas_freq when available, otherwise scan_freq and dist_angle_res.
+    :param scan: dict returned by LiDAR.scan()
+    :param n: number of beams, defaults to scan.dist_data_amnt
+    :return: numpy array of float64
+    """
+    if n is None:
+        n = scan.dist_data_amnt if scan.dist_data_amnt is not None else 0
+
+    if scan.meas_freq:
+        period = 1 / meas_freq_hz(scan)
+    elif scan.scan_freq and scan.dist_angle_res:
+        # dist_angle_res is given in 1/10000 degree
+        period = (scan.dist_angle_res / 10000) / (360 * scan.scan_freq)
+    else:
+        raise ValueError("scan has neither meas_freq nor scan_freq and dist_angle_res")
+
+    return np.arange(n, dtype=np.float64) * period
+
+
+def _lower_hull(x, y):
+    """
+    Returns the indices of the lower convex hull of points sorted by x (monotone chain).
+    """
+    hull = []
+    for i in range(len(x)):
+        while len(hull) > 1:
+            a, b = hull[-2], hull[-1]
+            # drop b when it lies on or above the segment from a to i
+            if (x[b] - x[a]) * (y[i] - y[a]) - (y[b] - y[a]) * (x[i] - x[a]) <= 0:
+                hull.pop()
+            else:
+                break
+        hull.append(i)
+    return hull
+
+
+class ClockSync:
+    """
+    Estimates the mapping between a device microsecond counter and host monotonic time.
+
+    The relation host = offset + skew * device is fitted on the lower envelope of the samples,
+    since transport and parsing delays can only make a frame arrive later. Samples are binned by
+    device time and only the fastest sample of each bin is kept. The skew (clock drift) is the
+    slope of the lower convex hull of these minima at their mean device time, the offset places
+    the line under all of them. Bins older than window seconds are dropped. Until the bins span
+    min_span seconds the skew is kept at 1, a slope over a short span mostly reflects delay noise.
+    Counter wraparound is unwrapped, a device reboot resets the estimator.
+    """
+
+    def __init__(self, window=600.0, bin_width=1.0, min_span=60.0, max_drift_ppm=500, wrap=COUNTER_WRAP):
+        """
+        :param window: device time in seconds spanned by the fit
+        :param bin_width: device time in seconds per bin of the lower envelope
+        :param min_span: device time in seconds the bins need to span before the skew is estimated
+        :param max_drift_ppm: limit of the estimated drift, guards against fits over a short span
+        :param wrap: counter modulus of the device clock
+        """
+        self.window = window
+        self.bin_width = bin_width
+        self.min_span = min_span
+        self.max_drift_ppm = max_drift_ppm
+        self.wrap = wrap
+        self.reset()
+
+    @property
+    def synced(self):
+        return self.offset is not None
+
+    @property
+    def drift_ppm(self):
+        return (self.skew - 1.0) * 1e6
+
+    @property
+    def span(self):
+        """
+        Device time in seconds covered by the fit.
+        """
+        if len(self._bins) < 2:
+            return 0.0
+        bins = list(self._bins.values())
+        return bins[-1][0] - bins[0][0]
+
+    def reset(self):
+        self._bins = {}     # bin index -> (device, host) of the fastest sample, relative to _ref
+        self._ref = None
+        self._last_raw = None
+        self._epochs = 0
+        self._intercept = 0.0
+        self.skew = 1.0
+        self.offset = None
+
+    def _unwrap(self, raw):
+        if self._last_raw is not None and raw < self._last_raw:
+            if self._last_raw - raw > self.wrap // 2:
+                self._epochs += 1
+            else:
+                log.info("Device clock jumped backwards, assuming device restart. Resetting clock sync.")
+                self.reset()
+        self._last_raw = raw
+        return (self._epochs * self.wrap + raw) * US
+
+    def update(self, device_us, host_time=None):
+        """
+        Adds a sample pairing a device counter value with the host time it was observed at.
+        :param device_us: raw device counter, preferably trans_time of a scan
+        :param host_time: host time in seconds, defaults to time.monotonic()
+        :return: host time estimate of device_us
+        """
+        if host_time is None:
+            host_time = time.monotonic()
+
+        device = self._unwrap(int(device_us))
+        if self._ref is None:
+            self._ref = (device, host_time)
+
+        # relative coordinates keep the fit precise for large counter and host values
+        x = device - self._ref[0]
+        y = host_time - self._ref[1]
+        b = int(x // self.bin_width)
+
+        best = self._bins.get(b)
+        if best is None:
+            self._bins[b] = (x, y)
+            oldest = b - int(self.window / self.bin_width)
+            for k in [k for k in self._bins if k < oldest]:
+                del self._bins[k]
+        elif y - x < best[1] - best[0]:
+            self._bins[b] = (x, y)
+        else:
+            return self._to_host(x)
+
+        self._fit()
+        return self._to_host(x)
+
+    def _fit(self):
+        x, y = np.array(list(self._bins.values())).T
+        hull = _lower_hull(x, y)
+
+        skew = 1.0
+        if len(hull) > 1 and x[-1] - x[0] >= self.min_span:
+            # the line under all points with the smallest mean distance touches the hull at the mean x
+            i = np.searchsorted(x[hull], x.mean()) - 1
+            i = min(max(i, 0), len(hull) - 2)
+            a, b = hull[i], hull[i + 1]
+            skew = (y[b] - y[a]) / (x[b] - x[a])
+            limit = self.max_drift_ppm * 1e-6
+            skew = min(max(skew, 1.0 - limit), 1.0 + limit)
+
+        self.skew = skew
+        self._intercept = np.min(y - skew * x)
+        self.offset = self._ref[1] + self._intercept - skew * self._ref[0]
+
+    def _to_host(self, x):
+        return self._ref[1] + self._intercept + self.skew * x
+
+    def update_from_scan(self, scan, host_time=None):
+        """
+        Adds the trans_time of a parsed scan as sample. host_time defaults to scan.host_time.
+        :param scan: dict returned by LiDAR.scan()
+        :return: host time estimate of the transmission of the scan
+        """
+        if host_time is None:
+            host_time = scan.get("host_time")
+        return self.update(scan.trans_time, host_time)
+
+    def to_host(self, device_us):
+        """
+        Converts raw device counter values close to the latest sample to host time. Vectorized.
+        :param device_us: scalar or array of raw device counter values
+        :return: host time in seconds, float or numpy array
+        """
+        if not self.synced:
+            raise RuntimeError("ClockSync has no samples yet, call update() first")
+
+        raw = np.asarray(device_us, dtype=np.int64)
+        half = self.wrap // 2
+        # signed distance to the latest sample, taking wraparound into account
+        delta = (raw - self._last_raw + half) % self.wrap - half
+        device = (self._epochs * self.wrap + self._last_raw + delta) * US
+        return self._to_host(device - self._ref[0])
+
+    def beam_times(self, scan):
+        """
+        Returns the host timestamp of every distance beam of a scan.
+        :param scan: dict returned by LiDAR.scan()
+        :return: numpy array of float64
+        """
+        return self.to_host(scan.uptime) + beam_offsets(scan) * self.skew
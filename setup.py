@@ -13,6 +13,9 @@ setuptools.setup(
     license='GNU General Public License v3.0',
     packages=setuptools.find_packages(),
     install_requires=[],
+    entry_points={
+        'console_scripts': ['pysicktim=pysicktim.cli:main'],
+    },
     author='Dennis van Peer',
     author_email='den.vanpeer+pypi@gmail.com',
     keywords=['tim561','tcp','sick','lidar','sicktim','tim5xx','sicktim5xx','sicktim561'],
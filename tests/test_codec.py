@@ -0,0 +1,88 @@
+import io
+
+import numpy as np
+import pytest
+
+from pysicktim.codec import (
+    BACKENDS, FLAG_KEYFRAME, CodecError, ScanEncoder, ScanDecoder,
+    zigzag, unzigzag, varint_pack, varint_unpack, hex_parse, hex_join, write_frame, iter_frames,
+)
+from pysicktim.emulator import synthetic_scans
+
+
+def test_zigzag_varint_round_trip():
+    values = np.array([0, 1, -1, 63, -64, 64, 2 ** 31, -2 ** 31, 2 ** 62, -2 ** 62])
+    packed = varint_pack(zigzag(values))
+    unpacked, used = varint_unpack(packed)
+    assert used == len(packed)
+    assert unzigzag(unpacked).tolist() == values.tolist()
+    assert varint_pack([0, 127, 128]) == b"\x00\x7f\x80\x01"
+
+
+def test_hex_round_trip():
+    values = np.array([0, 1, 15, 16, 255, 4096, 0xFFFFFFFF])
+    joined = hex_join(values)
+    assert joined == " ".join("%X" % v for v in values)
+    assert hex_parse(joined.split()).tolist() == values.tolist()
+    assert hex_parse(["ff", "A"]).tolist() == [255, 10]
+    assert hex_join([]) == "" and len(hex_parse([])) == 0
+
+
+@pytest.mark.parametrize("backend", list(BACKENDS))
+def test_round_trip_across_keyframes(backend):
+    scans = synthetic_scans(25)
+    encoder = ScanEncoder(backend=backend, keyframe_interval=10)
+    frames = [encoder.encode(scan) for scan in scans]
+    assert [bool(f[0] & FLAG_KEYFRAME) for f in frames] == [k % 10 == 0 for k in range(25)]
+
+    decoder = ScanDecoder()
+    for scan, frame in zip(scans, frames):
+        assert decoder.decode(frame) == scan
+
+
+def test_temporal_delta_is_used_for_static_scene():
+    scan = synthetic_scans(1)[0]
+    encoder = ScanEncoder(backend="zlib")
+    key = encoder.encode(scan)
+    delta = encoder.encode(scan)
+    assert len(delta) < len(key) / 3
+    decoder = ScanDecoder()
+    decoder.decode(key)
+    assert decoder.decode(delta) == scan
+
+
+def test_decoder_resyncs_on_keyframe():
+    scans = synthetic_scans(12)
+    encoder = ScanEncoder(keyframe_interval=5)
+    frames = [encoder.encode(scan) for scan in scans]
+
+    with pytest.raises(CodecError):
+        ScanDecoder().decode(frames[2])
+
+    decoder = ScanDecoder(skip_to_keyframe=True)
+    decoded = [decoder.decode(frame) for frame in frames[2:]]
+    assert decoded[:3] == [None, None, None]
+    assert decoded[3:] == scans[5:]
+
+
+@pytest.mark.parametrize("backend", list(BACKENDS))
+def test_corrupt_frames_raise_codec_error(backend):
+    frame = ScanEncoder(backend=backend).encode(synthetic_scans(1)[0])
+    for broken in (b"", frame[:len(frame) // 2], frame[:1] + bytes(len(frame) - 1)):
+        with pytest.raises(CodecError):
+            ScanDecoder().decode(broken)
+
+
+def test_stream_framing():
+    scans = synthetic_scans(5)
+    encoder = ScanEncoder()
+    f = io.BytesIO()
+    for scan in scans:
+        write_frame(f, encoder.encode(scan))
+    f.seek(0)
+    decoder = ScanDecoder()
+    assert [decoder.decode(frame) for frame in iter_frames(f)] == scans
+
+    f = io.BytesIO(f.getvalue()[:-3])
+    with pytest.raises(CodecError):
+        list(iter_frames(f))
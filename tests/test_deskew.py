@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from easydict import EasyDict as edict
+
+from pysicktim.deskew import deskew, points, PoseBuffer, ConstantVelocity
+from pysicktim.timing import beam_offsets
+
+
+def make_scan(distances):
+    return edict(
+        distances=list(distances), dist_data_amnt=len(distances),
+        dist_start_ang=-450000, dist_angle_res=3333, dist_scale_fact=1.0, dist_scale_fact_offset=0.0,
+        meas_freq=1.62, scan_freq=15.0,
+    )
+
+
+def wall_scan(poses, times, n=811):
+    """Scan of a wall at x = 5 m in the frame of the sensor at time 0, seen by a moving sensor."""
+    scan = make_scan([0] * n)
+    ang = np.deg2rad((scan.dist_start_ang + np.arange(n) * scan.dist_angle_res) / 10000)
+    x, _, yaw = poses.interpolate(times)
+    cos = np.cos(yaw + ang)
+    scan.distances = np.where(cos > 0.2, np.round((5 - x) / np.maximum(cos, 0.2) * 1000), 0).astype(int).tolist()
+    return scan
+
+
+def test_constant_velocity_removes_skew():
+    poses = ConstantVelocity(10.0, 0.0, 0.5)
+    times = beam_offsets(make_scan([0] * 811))
+    times -= times[-1]
+    scan = wall_scan(poses, times)
+
+    assert np.nanmax(abs(points(scan)[:, 0] - 5)) > 0.1
+    corrected = deskew(scan, poses, times=times, ref_time=0.0)
+    assert np.nanmax(abs(corrected[:, 0] - 5)) < 2e-3
+
+
+def test_pose_buffer_matches_constant_velocity():
+    poses = ConstantVelocity(10.0, 0.0, 0.5)
+    times = 100 + beam_offsets(make_scan([0] * 811))
+    poses.t0 = times[-1]
+    buffer = PoseBuffer()
+    for t in np.linspace(times[0] - 0.01, times[-1] + 0.01, 50):
+        x, y, yaw = poses.interpolate([t])
+        buffer.add(t, x[0], y[0], yaw[0])
+
+    scan = wall_scan(poses, times)
+    assert np.allclose(deskew(scan, buffer, times=times), deskew(scan, poses, times=times), atol=2e-3, equal_nan=True)
+
+
+def test_pose_buffer_rejects_times_outside_history():
+    buffer = PoseBuffer()
+    buffer.add(100.0, 0, 0, 0)
+    buffer.add(101.0, 1, 0, 0)
+    with pytest.raises(ValueError):
+        deskew(make_scan([1000] * 10), buffer)
+
+
+def test_empty_scan():
+    assert deskew(make_scan([]), ConstantVelocity(1.0, 0.0, 0.0)).shape == (0, 2)
+
+
+def test_scan_without_distance_channel():
+    scan = make_scan([])
+    scan.distances = None
+    scan.dist_scale_fact = None
+    with pytest.raises(ValueError):
+        points(scan)
+
+
+def test_pose_buffer_updates_after_add():
+    buffer = PoseBuffer()
+    buffer.add(0.0, 0, 0, 0)
+    buffer.add(1.0, 1, 0, 0)
+    assert buffer.interpolate([1.0])[0][0] == 1
+    buffer.add(2.0, 3, 0, 0)
+    assert buffer.interpolate([1.5])[0][0] == 2
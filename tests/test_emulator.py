@@ -0,0 +1,53 @@
+import threading
+import time
+
+from pysicktim.pysicktim import parse_scan, scan_counter
+from pysicktim.codec import ScanEncoder, ScanDecoder, iter_frames
+from pysicktim.emulator import Emulator, telegram, synthetic_scans
+from pysicktim.cli import main
+
+
+def recording(count=3):
+    encoder = ScanEncoder()
+    return [encoder.encode(scan) for scan in synthetic_scans(count)]
+
+
+def test_telegram_round_trip():
+    scan = synthetic_scans()[0]
+    data = telegram(scan)
+    assert scan_counter(data) == scan.scan_cnt
+    parsed = parse_scan(data)
+    parsed.host_time = scan.host_time
+    assert parsed == scan
+
+
+def test_emulator_repeats_scan_when_polled_fast():
+    emulator = Emulator(recording())
+    first = scan_counter(emulator.respond("sRN LMDscandata"))
+    assert scan_counter(emulator.respond("sRN LMDscandata")) == first
+    time.sleep(1.5 / 15)
+    assert scan_counter(emulator.respond("sRN LMDscandata")) == first + 1
+
+
+def test_emulator_ends_without_loop():
+    emulator = Emulator(recording(1), speed=10.0)
+    assert emulator.respond("sRN LMDscandata") is not None
+    time.sleep(0.2 / 15)
+    assert emulator.respond("sRN LMDscandata") is None
+
+
+def test_record_stops_at_end_of_replay(tmp_path, capsys):
+    emulator = Emulator(recording(5), address=("127.0.0.1", 0))
+    emulator.open()
+    thread = threading.Thread(target=emulator.serve_forever, daemon=True)
+    thread.start()
+
+    output = tmp_path / "scans.bin"
+    sensor = f"{emulator.address[0]}:{emulator.address[1]}"
+    assert main(["record", str(output), "-s", sensor, "--timeout", "5"]) == 1
+    thread.join(5)
+
+    assert "Recorded 5 frames" in capsys.readouterr().out
+    decoder = ScanDecoder()
+    with open(output, "rb") as f:
+        assert [decoder.decode(frame).scan_cnt for frame in iter_frames(f)] == list(range(5))
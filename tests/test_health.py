@@ -0,0 +1,32 @@
+import pytest
+from easydict import EasyDict as edict
+
+from pysicktim.pysicktim import LidarException, check_error
+from pysicktim.health import health, status_names
+
+
+def test_health_flags_status_and_invalid_beams():
+    summary = health(edict(device_stat=0x0102, distances=[0, 0, 0, 1000]))
+    assert summary.contamination_warning and not summary.error
+    assert summary.invalid_ratio == 0.75
+    assert summary.degraded
+    assert status_names(summary) == ["contamination_warning", "unknown_100"]
+
+
+def test_health_without_distance_channel_is_unknown():
+    summary = health(edict(device_stat=0, distances=None))
+    assert summary.ok
+    assert summary.invalid_ratio is None
+    assert not summary.degraded
+    assert status_names(summary) == []
+
+
+@pytest.mark.parametrize("answer, error_code", [
+    ("sFA 3", "Sopas_Error_VARIABLE_UNKNOWNINDEX"),
+    ("sFA 1A", "Sopas_Error_ComplexArraysNotSupported"),
+    ("sFA 2B", "Sopas_Error_2B"),
+])
+def test_check_error_decodes_full_code(answer, error_code):
+    with pytest.raises(LidarException) as e:
+        check_error(answer)
+    assert e.value.error_code == error_code
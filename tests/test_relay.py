@@ -0,0 +1,82 @@
+import time
+
+from easydict import EasyDict as edict
+
+from pysicktim.pysicktim import LidarException
+from pysicktim.emulator import telegram
+from pysicktim.relay import Relay, RelayClient
+
+
+class PolledDevice:
+    """
+    Answers every poll with the latest scan of a 100 Hz device.
+    The fifth poll fails, the seventh returns a broken telegram and the ninth loses the connection.
+    """
+
+    freq = 100.0
+
+    def __init__(self):
+        self.polls = 0
+        self.opened = 0
+        self.start = time.monotonic()
+
+    def open(self):
+        self.opened += 1
+
+    def close(self):
+        pass
+
+    def scan(self, raw=False):
+        self.polls += 1
+        time.sleep(0.001)
+        if self.polls == 5:
+            raise LidarException("Sopas_Error_METHODIN_SERVER_BUSY", "busy")
+        if self.polls == 9:
+            raise RuntimeError("socket connection broken")
+        cnt = int((time.monotonic() - self.start) * self.freq)
+        data = telegram(edict(
+            version=1, device_num=1, serial_num=1, device_stat=0, telegram_cnt=cnt, scan_cnt=cnt,
+            uptime=cnt, trans_time=cnt, input_stat=0, output_stat=0, layer_ang=0, scan_freq=self.freq, meas_freq=1.62,
+            dist_label="DIST1", dist_scale_fact=1.0, dist_scale_fact_offset=0.0,
+            dist_start_ang=-450000, dist_angle_res=3333, distances=[cnt + 1000] * 811,
+            rssi_label=None, rssi=None,
+        ))
+        if self.polls == 7:
+            return " ".join(data.split()[:18])
+        return data
+
+
+class LostDevice(PolledDevice):
+    """Fails every poll after the first one."""
+
+    def scan(self, raw=False):
+        if self.polls:
+            raise OSError("timed out")
+        return super().scan(raw)
+
+
+def test_relay_paces_polls_and_recovers():
+    device = PolledDevice()
+    relay = Relay(device, address=("127.0.0.1", 0), error_backoff=0.01)
+    relay.start()
+    client = RelayClient(relay.address, socket_timeout=5)
+    try:
+        client.open()
+        counts = [client.scan().scan_cnt for _ in range(20)]
+    finally:
+        client.close()
+        relay.stop()
+
+    assert counts == sorted(set(counts))
+    assert relay.skipped == 1
+    assert device.opened == 2
+    # one poll per scan plus about one early poll, instead of polling as fast as the device answers
+    assert device.polls < 3 * (relay.frames + 5)
+
+
+def test_relay_gives_up_on_lost_device():
+    device = LostDevice()
+    relay = Relay(device, address=("127.0.0.1", 0), error_backoff=0.001, reconnect_attempts=3)
+    assert relay.serve_forever() is False
+    assert relay.failed
+    assert device.opened == 4
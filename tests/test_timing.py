@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from easydict import EasyDict as edict
+
+from pysicktim.timing import ClockSync, COUNTER_WRAP, beam_offsets
+
+
+def simulate(sync, seconds, drift=30e-6, delay=0.066, start=4000.0, seed=0):
+    """Polls a 15 Hz device whose clock runs fast by drift, with uniform transport delay up to delay."""
+    rng = np.random.default_rng(seed)
+    for k in range(int(seconds * 15)):
+        device = start + k / 15
+        raw = int(device * 1e6) % COUNTER_WRAP
+        host = 100 + device * (1 + drift)
+        sync.update(raw, host + rng.uniform(0, delay))
+    return raw, host
+
+
+def test_drift_is_fitted_on_lower_envelope():
+    sync = ClockSync()
+    raw, host = simulate(sync, 600)
+    assert sync.drift_ppm == pytest.approx(30, abs=5)
+    assert sync.to_host(raw) == pytest.approx(host, abs=1e-3)
+
+
+def test_skew_is_held_until_min_span():
+    sync = ClockSync(min_span=60)
+    raw, host = simulate(sync, 30)
+    assert sync.skew == 1.0
+    assert sync.to_host(raw) == pytest.approx(host, abs=2e-3)
+
+
+def test_counter_wraparound_is_unwrapped():
+    sync = ClockSync()
+    # starts 10 s before the 32 bit microsecond counter wraps
+    raw, host = simulate(sync, 60, drift=0, start=COUNTER_WRAP * 1e-6 - 10)
+    assert raw < 60e6
+    assert sync.to_host(raw) == pytest.approx(host, abs=1e-3)
+    # values just before the wrap map to the past
+    assert sync.to_host(COUNTER_WRAP - 1) == pytest.approx(host - (raw + 1) * 1e-6, abs=1e-3)
+
+
+def test_backwards_jump_resets():
+    sync = ClockSync()
+    simulate(sync, 30, start=1000)
+    sync.update(5_000_000, 500.0)
+    assert sync.span == 0
+    assert sync.skew == 1.0
+    assert sync.to_host(5_000_000) == pytest.approx(500.0)
+
+
+def test_beam_times_follow_meas_freq():
+    sync = ClockSync()
+    sync.update(1_000_000, 10.0)
+    scan = edict(uptime=1_000_000, meas_freq=1.62, scan_freq=15.0, dist_angle_res=3333, dist_data_amnt=811)
+    times = sync.beam_times(scan)
+    assert len(times) == 811
+    assert times[0] == pytest.approx(10.0)
+    assert times[-1] - times[0] == pytest.approx(810 / 16200)
+    assert np.allclose(beam_offsets(scan), times - times[0])